@@ -5,14 +5,234 @@ Enhanced build_automation.py with CI/CD integration
 
 import os
 import sys
-import subprocess
 import json
-from datetime import datetime
+import functools
+import re
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class CIEnv:
+    """CI platform and commit details resolved from the environment"""
+    platform: str
+    sha: Optional[str] = None
+    short_sha: Optional[str] = None
+    branch: Optional[str] = None
+
+
+@functools.cache
+def get_ci_env():
+    """Read CI environment variables once and cache the result.
+    
+    When several platforms' variables are set, GitHub Actions wins over
+    GitLab CI, which wins over Jenkins.
+    """
+    env = dict(os.environ)
+    if env.get('GITHUB_ACTIONS'):
+        sha = env.get('GITHUB_SHA')
+        return CIEnv('github_actions', sha, sha[:7] if sha else None,
+                     env.get('GITHUB_REF_NAME'))
+    elif env.get('GITLAB_CI'):
+        sha = env.get('CI_COMMIT_SHA')
+        return CIEnv('gitlab_ci', sha,
+                     env.get('CI_COMMIT_SHORT_SHA') or (sha[:7] if sha else None),
+                     env.get('CI_COMMIT_BRANCH'))
+    elif env.get('JENKINS_HOME'):
+        sha = env.get('GIT_COMMIT')
+        return CIEnv('jenkins', sha,
+                     env.get('GIT_COMMIT_SHORT') or (sha[:7] if sha else None),
+                     env.get('GIT_BRANCH'))
+    else:
+        return CIEnv('local')
+
+
+# Kubernetes manifests have a fixed shape, so they are rendered from templates
+# rather than serialized with PyYAML. Fields are substituted with
+# str.format(); string values must go through _yaml_str() first.
+DEPLOYMENT_TEMPLATE = """\
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  labels:
+    app: {app}
+    managed-by: {managed_by}
+    version: {version}
+  name: {name}
+spec:
+  replicas: {replicas}
+  selector:
+    matchLabels:
+      app: {app}
+  template:
+    metadata:
+      annotations:
+        prometheus.io/port: {port_str}
+        prometheus.io/scrape: 'true'
+      labels:
+        app: {app}
+        version: {version}
+    spec:
+      containers:
+      - env:
+        - name: ENVIRONMENT
+          value: production
+        - name: VERSION
+          value: {version}
+        image: {image}
+        imagePullPolicy: Always
+        livenessProbe:
+          httpGet:
+            path: /health
+            port: http
+          initialDelaySeconds: 30
+          periodSeconds: 10
+        name: {app}
+        ports:
+        - containerPort: {port}
+          name: http
+          protocol: TCP
+        readinessProbe:
+          httpGet:
+            path: /ready
+            port: http
+          initialDelaySeconds: 5
+          periodSeconds: 5
+        resources:
+          limits:
+            cpu: 500m
+            memory: 512Mi
+          requests:
+            cpu: 250m
+            memory: 256Mi
+"""
+
+SERVICE_TEMPLATE = """\
+apiVersion: v1
+kind: Service
+metadata:
+  labels:
+    app: {app}
+  name: {name}
+spec:
+  ports:
+  - name: http
+    port: 80
+    protocol: TCP
+    targetPort: http
+  selector:
+    app: {app}
+  type: LoadBalancer
+"""
+
+_PLAIN_YAML_STR = re.compile(r'[A-Za-z_][A-Za-z0-9_./@-]*(?::[A-Za-z0-9_./@-]+)*')
+_YAML_KEYWORDS = {'y', 'n', 'yes', 'no', 'on', 'off', 'true', 'false', 'null'}
+
+
+def _yaml_str(value):
+    """Render a string as a YAML scalar, quoting it when it isn't plain-safe"""
+    value = str(value)
+    if _PLAIN_YAML_STR.fullmatch(value) and value.lower() not in _YAML_KEYWORDS:
+        return value
+    # JSON strings are valid double-quoted YAML scalars
+    return json.dumps(value)
+
+
+@functools.lru_cache(maxsize=8)
+def _build_manifests(app, image, version, port, replicas, ci_env='local'):
+    """Render the deployment and service manifests as encoded YAML"""
+    deployment = DEPLOYMENT_TEMPLATE.format(
+        name=_yaml_str(f"{app}-deployment"),
+        app=_yaml_str(app),
+        version=_yaml_str(version),
+        managed_by=_yaml_str(f'ci-{ci_env}'),
+        replicas=replicas,
+        port=port,
+        port_str=_yaml_str(str(port)),
+        image=_yaml_str(image)
+    )
+    
+    service = SERVICE_TEMPLATE.format(
+        name=_yaml_str(f"{app}-service"),
+        app=_yaml_str(app)
+    )
+    
+    return deployment.encode(), service.encode()
+
+
+def _read_git_head(repo='.'):
+    """Read the HEAD commit SHA and branch directly from the .git directory"""
+    git_dir = Path(repo) / '.git'
+    head = (git_dir / 'HEAD').read_text().strip()
+    if not head.startswith('ref: '):
+        # Detached HEAD holds the SHA itself
+        return head, 'HEAD'
+    
+    ref = head[len('ref: '):]
+    branch = ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ref
+    try:
+        return (git_dir / ref).read_text().strip(), branch
+    except FileNotFoundError:
+        pass
+    
+    # Ref has been packed by git gc
+    with open(git_dir / 'packed-refs') as f:
+        for line in f:
+            sha, _, name = line.rstrip('\n').partition(' ')
+            if name == ref:
+                return sha, branch
+    raise FileNotFoundError(f"{ref} not found in {git_dir}")
+
+
+def _pygit2_head(repo='.'):
+    """Read HEAD through libgit2, or None if pygit2 is unavailable or fails"""
+    try:
+        import pygit2
+    except ImportError:
+        return None
+    try:
+        path = pygit2.discover_repository(repo)
+        if path is None:
+            return None
+        repository = pygit2.Repository(path)
+        head = repository.head
+    except pygit2.GitError:
+        return None
+    branch = 'HEAD' if repository.head_is_detached else head.shorthand
+    return str(head.target), branch
+
+
+# Minimal environment for child processes: CI runners export hundreds of
+# variables that git doesn't need. GIT_* is kept so GIT_DIR, GIT_WORK_TREE,
+# GIT_CONFIG_* and friends still select the right repository
+_SLIM_ENV = {key: value for key, value in os.environ.items()
+             if key in ('PATH', 'HOME', 'USER', 'LANG', 'SYSTEMROOT')
+             or key.startswith('GIT_')}
+
+
+def _git_rev_parse_head():
+    """Ask git for the HEAD commit SHA and branch, or None if unavailable"""
+    import subprocess
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', 'HEAD', '--abbrev-ref', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+            stdin=subprocess.DEVNULL,
+            env=_SLIM_ENV
+        )
+        sha, branch = result.stdout.split()
+    except (subprocess.CalledProcessError, OSError, ValueError):
+        return None
+    return sha, branch
+
 
 class CIAwareBuildAutomation:
     def __init__(self):
         self.ci_env = self.detect_ci_environment()
+        self._git_info = None
         self.config = self.load_ci_config()
         self.app_name = self.config.get('app_name', 'myapp')
         self.version = self.get_version()
@@ -20,14 +240,7 @@ class CIAwareBuildAutomation:
         
     def detect_ci_environment(self):
         """Detect which CI/CD platform is running"""
-        if os.getenv('GITHUB_ACTIONS'):
-            return 'github_actions'
-        elif os.getenv('GITLAB_CI'):
-            return 'gitlab_ci'
-        elif os.getenv('JENKINS_HOME'):
-            return 'jenkins'
-        else:
-            return 'local'
+        return get_ci_env().platform
     
     def load_ci_config(self):
         """Load configuration from environment variables or config file"""
@@ -40,38 +253,56 @@ class CIAwareBuildAutomation:
         config['replicas'] = int(os.getenv('REPLICAS', '3'))
         
         # CI-specific configurations
-        if self.ci_env == 'github_actions':
-            config['image_tag'] = f"{config['docker_registry']}/{config['app_name']}:{os.getenv('GITHUB_SHA', 'latest')[:7]}"
-            config['branch'] = os.getenv('GITHUB_REF_NAME', 'unknown')
-        elif self.ci_env == 'gitlab_ci':
-            config['image_tag'] = f"{config['docker_registry']}:{os.getenv('CI_COMMIT_SHORT_SHA', 'latest')}"
-            config['branch'] = os.getenv('CI_COMMIT_BRANCH', 'unknown')
-        elif self.ci_env == 'jenkins':
-            git_commit = os.getenv('GIT_COMMIT_SHORT', 'latest')
-            config['image_tag'] = f"{config['docker_registry']}/{config['app_name']}:{git_commit}"
-            config['branch'] = os.getenv('GIT_BRANCH', 'unknown')
+        ci = get_ci_env()
+        git_info = self.get_git_info()
+        if ci.platform != 'local':
+            tag = git_info.get('short_sha') or 'latest'
+            if ci.platform == 'gitlab_ci':
+                config['image_tag'] = f"{config['docker_registry']}:{tag}"
+            else:
+                config['image_tag'] = f"{config['docker_registry']}/{config['app_name']}:{tag}"
+        config['branch'] = git_info.get('branch') or 'unknown'
         
         return config
     
+    def get_git_info(self):
+        """Get commit and branch from CI, .git or a single git invocation (cached)"""
+        ci = get_ci_env()
+        if self._git_info is None and ci.platform != 'local':
+            # The CI platform owns the revision; don't touch git
+            self._git_info = {
+                'sha': ci.sha or ci.short_sha,
+                'short_sha': ci.short_sha,
+                'branch': ci.branch
+            }
+        if self._git_info is None:
+            try:
+                head = _read_git_head()
+            except OSError:
+                # Worktrees, submodules or source archives: ask libgit2,
+                # then git itself
+                head = _pygit2_head() or _git_rev_parse_head()
+            if head:
+                sha, branch = head
+                self._git_info = {
+                    'sha': sha,
+                    'short_sha': sha[:7],
+                    'branch': branch
+                }
+            else:
+                self._git_info = {}
+        return self._git_info
+    
     def get_version(self):
         """Get version from CI environment or git"""
-        if self.ci_env == 'github_actions':
-            return os.getenv('GITHUB_SHA', 'unknown')[:7]
-        elif self.ci_env == 'gitlab_ci':
-            return os.getenv('CI_COMMIT_SHORT_SHA', 'unknown')
-        elif self.ci_env == 'jenkins':
-            return os.getenv('GIT_COMMIT_SHORT', 'unknown')
+        git_info = self.get_git_info()
+        if git_info.get('short_sha'):
+            return git_info['short_sha']
+        elif get_ci_env().platform != 'local':
+            return 'unknown'
         else:
-            try:
-                result = subprocess.run(
-                    ['git', 'rev-parse', '--short', 'HEAD'],
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-                return result.stdout.strip()
-            except:
-                return datetime.now().strftime('%Y%m%d%H%M%S')
+            from datetime import datetime
+            return datetime.now().strftime('%Y%m%d%H%M%S')
     
     def generate_kubernetes_manifests(self):
         """Generate Kubernetes deployment manifests with CI-aware image tags"""
@@ -82,109 +313,26 @@ class CIAwareBuildAutomation:
         # Use IMAGE_PLACEHOLDER for CI/CD pipelines to replace later
         image_name = self.config.get('image_tag', 'IMAGE_PLACEHOLDER')
         
-        deployment = {
-            'apiVersion': 'apps/v1',
-            'kind': 'Deployment',
-            'metadata': {
-                'name': f"{self.app_name}-deployment",
-                'labels': {
-                    'app': self.app_name,
-                    'version': self.version,
-                    'managed-by': f'ci-{self.ci_env}'
-                }
-            },
-            'spec': {
-                'replicas': self.config.get('replicas', 3),
-                'selector': {
-                    'matchLabels': {'app': self.app_name}
-                },
-                'template': {
-                    'metadata': {
-                        'labels': {
-                            'app': self.app_name,
-                            'version': self.version
-                        },
-                        'annotations': {
-                            'prometheus.io/scrape': 'true',
-                            'prometheus.io/port': str(self.config.get('port', 8000))
-                        }
-                    },
-                    'spec': {
-                        'containers': [{
-                            'name': self.app_name,
-                            'image': image_name,
-                            'imagePullPolicy': 'Always',
-                            'ports': [{
-                                'name': 'http',
-                                'containerPort': self.config.get('port', 8000),
-                                'protocol': 'TCP'
-                            }],
-                            'env': [
-                                {'name': 'ENVIRONMENT', 'value': 'production'},
-                                {'name': 'VERSION', 'value': self.version}
-                            ],
-                            'resources': {
-                                'requests': {
-                                    'memory': '256Mi',
-                                    'cpu': '250m'
-                                },
-                                'limits': {
-                                    'memory': '512Mi',
-                                    'cpu': '500m'
-                                }
-                            },
-                            'livenessProbe': {
-                                'httpGet': {
-                                    'path': '/health',
-                                    'port': 'http'
-                                },
-                                'initialDelaySeconds': 30,
-                                'periodSeconds': 10
-                            },
-                            'readinessProbe': {
-                                'httpGet': {
-                                    'path': '/ready',
-                                    'port': 'http'
-                                },
-                                'initialDelaySeconds': 5,
-                                'periodSeconds': 5
-                            }
-                        }]
-                    }
-                }
-            }
-        }
-        
-        service = {
-            'apiVersion': 'v1',
-            'kind': 'Service',
-            'metadata': {
-                'name': f"{self.app_name}-service",
-                'labels': {'app': self.app_name}
-            },
-            'spec': {
-                'selector': {'app': self.app_name},
-                'ports': [{
-                    'name': 'http',
-                    'protocol': 'TCP',
-                    'port': 80,
-                    'targetPort': 'http'
-                }],
-                'type': 'LoadBalancer'
-            }
-        }
+        deployment, service = _build_manifests(
+            self.app_name,
+            image_name,
+            self.version,
+            int(self.config.get('port', 8000)),
+            int(self.config.get('replicas', 3)),
+            self.ci_env
+        )
         
         # Write manifests
-        import yaml
-        
         deployment_file = self.build_dir / 'deployment.yaml'
         service_file = self.build_dir / 'service.yaml'
         
-        with open(deployment_file, 'w') as f:
-            yaml.dump(deployment, f, default_flow_style=False)
-        
-        with open(service_file, 'w') as f:
-            yaml.dump(service, f, default_flow_style=False)
+        # Both writes are I/O bound, so overlap them on slow workspaces
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(
+                lambda item: item[0].write_bytes(item[1]),
+                [(deployment_file, deployment), (service_file, service)]
+            ))
         
         print(f"✅ Manifests generated in {self.build_dir}/")
         print(f"   - Deployment: {deployment_file}")
@@ -194,6 +342,8 @@ class CIAwareBuildAutomation:
     
     def create_build_info(self):
         """Create build information file"""
+        from datetime import datetime
+        
         build_info = {
             'app_name': self.app_name,
             'version': self.version,
@@ -204,8 +354,7 @@ class CIAwareBuildAutomation:
         }
         
         info_file = self.build_dir / 'build-info.json'
-        with open(info_file, 'w') as f:
-            json.dump(build_info, f, indent=2)
+        info_file.write_bytes(json.dumps(build_info, indent=2).encode())
         
         print(f"✅ Build info saved to {info_file}")
         return info_file
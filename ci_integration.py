@@ -5,18 +5,18 @@ ci_integration.py - Integrate build automation with CI/CD platforms
 
 import os
 import sys
-from build_automation import BuildAutomation
+from build_automation import BuildAutomation, get_ci_env
+
+CI_PLATFORM_NAMES = {
+    'github_actions': 'github',
+    'gitlab_ci': 'gitlab',
+    'jenkins': 'jenkins',
+    'local': 'local'
+}
 
 def get_ci_environment():
-    """Detect CI/CD environment"""
-    if os.getenv('JENKINS_HOME'):
-        return 'jenkins'
-    elif os.getenv('GITLAB_CI'):
-        return 'gitlab'
-    elif os.getenv('GITHUB_ACTIONS'):
-        return 'github'
-    else:
-        return 'local'
+    """Detect CI/CD environment (same precedence as build_automation)"""
+    return CI_PLATFORM_NAMES[get_ci_env().platform]
 
 def setup_ci_config():
     """Setup configuration based on CI environment"""
@@ -3,76 +3,195 @@
 deploy_to_k8s.py - Deploy application to Kubernetes cluster
 """
 
-import subprocess
-import json
 from pathlib import Path
 
+import urllib3
+import yaml
+from kubernetes import client, config, dynamic, watch
+from kubernetes.client.rest import ApiException
+
+# Field manager recorded on objects this script applies
+FIELD_MANAGER = 'deploy_to_k8s'
+
+# Manifests written by build_automation.py, in apply order
+MANIFEST_FILES = ('deployment.yaml', 'service.yaml')
+
+# Cluster probes already answered in this process, keyed by kubeconfig
+# context, so jobs that deploy several services only pay for them once
+_verified_contexts = set()
+_known_namespaces = {}
+
+# Cache key used when running from a pod's service account
+IN_CLUSTER_CONTEXT = 'in-cluster'
+
 class KubernetesDeployer:
     def __init__(self, namespace='default'):
         self.namespace = namespace
         self.build_dir = Path('build')
+        self._api_client = None
+        self._dynamic_client = None
+        self.context = None
+    
+    @property
+    def api_client(self):
+        """Shared API client so every call reuses one HTTPS connection pool"""
+        if self._api_client is None:
+            try:
+                config.load_kube_config()
+                _, active_context = config.list_kube_config_contexts()
+                self.context = active_context['name']
+            except config.ConfigException:
+                # No kubeconfig: use the pod's service account, as kubectl does
+                config.load_incluster_config()
+                self.context = IN_CLUSTER_CONTEXT
+            self._api_client = client.ApiClient()
+        return self._api_client
     
     def check_cluster_connection(self):
-        """Verify kubectl can connect to cluster"""
+        """Verify the API server is reachable"""
         print("🔍 Checking cluster connection...")
         try:
-            result = subprocess.run(
-                ['kubectl', 'cluster-info'],
-                capture_output=True,
-                check=True
-            )
+            api_client = self.api_client
+            if self.context not in _verified_contexts:
+                client.VersionApi(api_client).get_code()
+                _verified_contexts.add(self.context)
             print("✅ Connected to Kubernetes cluster")
             return True
-        except subprocess.CalledProcessError:
+        except (ApiException, config.ConfigException, urllib3.exceptions.HTTPError):
             print("❌ Cannot connect to Kubernetes cluster")
             return False
     
     def create_namespace(self):
         """Create namespace if it doesn't exist"""
+        core = client.CoreV1Api(self.api_client)
+        namespaces = _known_namespaces.get(self.context)
+        if namespaces is None:
+            try:
+                namespaces = {ns.metadata.name for ns in core.list_namespace().items}
+            except ApiException:
+                # Not allowed to list namespaces; fall back to creating
+                namespaces = set()
+            _known_namespaces[self.context] = namespaces
+        
+        if self.namespace in namespaces:
+            return
+        
         print(f"📦 Creating namespace: {self.namespace}")
-        subprocess.run(
-            ['kubectl', 'create', 'namespace', self.namespace],
-            capture_output=True
+        try:
+            core.create_namespace(
+                client.V1Namespace(metadata=client.V1ObjectMeta(name=self.namespace))
+            )
+        except ApiException:
+            # Already exists, or we may not create namespaces; apply will
+            # surface any real problem
+            pass
+        namespaces.add(self.namespace)
+    
+    @property
+    def dynamic_client(self):
+        """Dynamic client for server-side apply, sharing the API client"""
+        if self._dynamic_client is None:
+            self._dynamic_client = dynamic.DynamicClient(self.api_client)
+        return self._dynamic_client
+    
+    def apply_object(self, obj):
+        """Server-side apply a manifest object, creating or updating it"""
+        resource = self.dynamic_client.resources.get(
+            api_version=obj['apiVersion'], kind=obj['kind']
+        )
+        # Fields dropped from the manifest are removed from the live object,
+        # as with `kubectl apply`
+        resource.server_side_apply(
+            body=obj,
+            namespace=self.namespace,
+            field_manager=FIELD_MANAGER,
+            force_conflicts=True
         )
     
     def apply_manifests(self):
         """Apply Kubernetes manifests"""
         print("🚀 Deploying to Kubernetes...")
         
-        manifests = list(self.build_dir.glob('*.yaml'))
+        manifests = [self.build_dir / name for name in MANIFEST_FILES
+                     if (self.build_dir / name).exists()]
         
         for manifest in manifests:
             print(f"   Applying {manifest.name}...")
-            subprocess.run(
-                ['kubectl', 'apply', '-f', str(manifest), '-n', self.namespace],
-                check=True
-            )
+            with open(manifest) as f:
+                for obj in yaml.safe_load_all(f):
+                    if obj:
+                        self.apply_object(obj)
         
         print("✅ Deployment complete!")
     
-    def wait_for_rollout(self, deployment_name):
+    def wait_for_rollout(self, deployment_name, timeout=600):
         """Wait for deployment to complete"""
         print(f"⏳ Waiting for rollout of {deployment_name}...")
-        subprocess.run(
-            ['kubectl', 'rollout', 'status', f'deployment/{deployment_name}',
-             '-n', self.namespace],
-            check=True
+        apps = client.AppsV1Api(self.api_client)
+        field_selector = f'metadata.name={deployment_name}'
+        
+        deployments = apps.list_namespaced_deployment(
+            self.namespace, field_selector=field_selector
         )
+        if not deployments.items:
+            raise LookupError(
+                f"Deployment {deployment_name} not found in namespace {self.namespace}"
+            )
+        
+        if not self.rollout_complete(deployments.items[0]):
+            # Stream status changes over one connection instead of polling
+            w = watch.Watch()
+            for event in w.stream(
+                apps.list_namespaced_deployment,
+                namespace=self.namespace,
+                field_selector=field_selector,
+                resource_version=deployments.metadata.resource_version,
+                timeout_seconds=timeout
+            ):
+                if event['type'] == 'DELETED':
+                    w.stop()
+                    raise LookupError(
+                        f"Deployment {deployment_name} was deleted during rollout"
+                    )
+                if self.rollout_complete(event['object']):
+                    w.stop()
+                    break
+            else:
+                raise TimeoutError(
+                    f"Rollout of {deployment_name} did not finish in {timeout}s"
+                )
+        
         print("✅ Rollout complete!")
     
+    @staticmethod
+    def rollout_complete(deployment):
+        """Same completion check as `kubectl rollout status`; raises if the
+        rollout exceeded its progress deadline"""
+        status = deployment.status
+        if (status.observed_generation or 0) < deployment.metadata.generation:
+            return False
+        
+        for condition in status.conditions or []:
+            if (condition.type == 'Progressing'
+                    and condition.reason == 'ProgressDeadlineExceeded'):
+                raise RuntimeError(
+                    f"Rollout of {deployment.metadata.name} exceeded its progress deadline"
+                )
+        
+        desired = deployment.spec.replicas if deployment.spec.replicas is not None else 1
+        return (
+            (status.updated_replicas or 0) == desired
+            and (status.replicas or 0) == desired
+            and (status.available_replicas or 0) == desired
+        )
+    
     def get_service_info(self, service_name):
         """Get service endpoint information"""
         print(f"📡 Getting service info for {service_name}...")
-        result = subprocess.run(
-            ['kubectl', 'get', 'service', service_name, '-n', self.namespace,
-             '-o', 'json'],
-            capture_output=True,
-            text=True,
-            check=True
+        service = client.CoreV1Api(self.api_client).read_namespaced_service(
+            service_name, self.namespace
         )
-        
-        service = json.loads(result.stdout)
-        return service
+        return self.api_client.sanitize_for_serialization(service)
     
     def deploy(self, app_name):
         """Execute complete deployment"""